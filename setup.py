@@ -12,8 +12,7 @@ setup(
 	packages=find_packages(),
 	install_requires=[
         'trio',
-        'asks',
-        'web3',
+        'httpx[http2]',
         'eth_abi',
         'msgspec',
         'hexbytes',
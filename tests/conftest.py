@@ -7,8 +7,24 @@ NODE_URL = 'http://mainnet.telos.net/evm'
 
 @pytest.fixture
 async def w3():
-    _w3 = AsyncWeb3(NODE_URL, {'chain_id': 40})
-    yield _w3
+    async with AsyncWeb3(NODE_URL, {'chain_id': 40}) as _w3:
+        yield _w3
+
+
+@pytest.fixture
+async def cached_w3(tmp_path):
+    async with AsyncWeb3(
+        NODE_URL, {'chain_id': 40}, block_cache_path=tmp_path
+    ) as _w3:
+        yield _w3
+
+
+@pytest.fixture
+async def batched_w3():
+    async with AsyncWeb3(
+        NODE_URL, {'chain_id': 40, 'batch_window_ms': 5, 'max_batch_size': 4}
+    ) as _w3:
+        yield _w3
 
 
 @pytest.fixture
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import time
 
+import trio
+
 
 async def test_get_block(w3):
 
@@ -8,3 +10,32 @@ async def test_get_block(w3):
         'latest', full_transactions=True)
 
     assert time.time() - block.timestamp < 30
+
+
+async def test_batched_calls(batched_w3):
+    results = {}
+
+    async def call(key, method, *args):
+        results[key] = await getattr(batched_w3, method)(*args)
+
+    async with trio.open_nursery() as n:
+        for i in range(10):
+            n.start_soon(call, ('chain_id', i), 'chain_id')
+            n.start_soon(call, ('block_number', i), 'block_number')
+
+    chain_ids = {results['chain_id', i] for i in range(10)}
+    assert len(chain_ids) == 1
+    assert int(chain_ids.pop(), 16) == 40
+
+    head = await batched_w3.block_number()
+    assert all(0 < results['block_number', i] <= head for i in range(10))
+
+
+async def test_split_batch(batched_w3):
+    # more calls than the configured max_batch_size of 4
+    resps = await batched_w3.json_rpc_batch(
+        [('eth_chainId', [])] * 5 + [('eth_blockNumber', [])] * 5)
+
+    assert len(resps) == 10
+    assert all(int(resp.result, 16) == 40 for resp in resps[:5])
+    assert all(int(resp.result, 16) > 0 for resp in resps[5:])
@@ -30,3 +30,45 @@ async def test_contract_async_call_with_param(w3, erc20_info):
     )
 
     assert result != 0
+
+
+async def test_contract_decode_output(w3, erc20_info):
+    addr, abi = erc20_info
+    w3.add_contract(addr, abi)
+
+    result = w3.decode_fn_output(
+        addr,
+        'balanceOf',
+        '0x' + '00' * 31 + '2a'
+    )
+
+    assert result == [42]
+
+    results = w3.decode_fn_outputs(
+        addr,
+        'balanceOf',
+        ['0x' + '00' * 31 + '2a', bytes(31) + b'\x07']
+    )
+
+    assert results == [[42], [7]]
+
+
+async def test_contract_call_batch(w3, erc20_info):
+    addr, abi = erc20_info
+    w3.add_contract(addr, abi)
+
+    holder = '0x51DFB88958df54E357fBAcC8516194944E389Ce2'
+    results = await w3.eth_call_batch(
+        [
+            (addr, 'name', (), {}),
+            (addr, 'balanceOf', (holder,), {}),
+            (addr, 'name', (), {})
+        ],
+        ZERO_ADDR,
+        1
+    )
+
+    assert len(results) == 3
+    assert 'Tether USD' in results[0]
+    assert results[1] != 0
+    assert results[0] == results[2]
@@ -25,6 +25,23 @@ async def test_stream_old_range(w3):
             last_block = block
 
 
+async def test_stream_old_range_cached(cached_w3):
+    start_block = 180698860
+    runs = []
+    for _ in range(2):
+        async with cached_w3.stream_blocks(
+            start_block,
+            end_block=start_block + 100,
+            max_tasks=50
+        ) as stream:
+            runs.append([block async for block in stream])
+
+    # second run is served from the block cache
+    assert runs[0] == runs[1]
+    assert [block.number for block in runs[1]] == list(
+        range(start_block, start_block + 101))
+
+
 async def test_stream_catch_up(w3):
     amount = 50
     last_block = None
@@ -2,106 +2,451 @@
 
 import logging
 
-from typing import Any, Sequence
+from typing import Any, Iterator, Sequence
+from pathlib import Path
+from binascii import unhexlify
 from itertools import count
 from contextlib import asynccontextmanager as acm, aclosing
 
-import asks
 import trio
+import httpx
+import msgspec
 
-from web3.types import (
-    ABI
-)
-from eth_utils import (
-    decode_hex,
-    is_hexstr
-)
 from eth_typing import (
+    ABI,
     HexStr,
     TypeStr,
     ChecksumAddress
 )
 
 from trio_web3.types import (
-    JSONRPCResult, Block, ChainOptions,
+    RPCRequest, JSONRPCResult, JSONRPCOk, JSONRPCId, Block, ChainOptions,
 )
 
 from .contract import (
     DummyW3,
     W3Contract,
-    call_contract_function
+    prepare_fn_call,
+    decode_function_output,
+    call_contract_function,
+    unwrap_call_output
+)
+
+
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+_REQ_ENCODER = msgspec.json.Encoder()
+_ERROR_DECODER = msgspec.json.Decoder(JSONRPCResult)
+_ERROR_BATCH_DECODER = msgspec.json.Decoder(list[JSONRPCResult])
+_RESULT_DECODER = msgspec.json.Decoder(JSONRPCOk)
+_BATCH_DECODER = msgspec.json.Decoder(list[JSONRPCOk])
+_HEX_DECODER = msgspec.json.Decoder(JSONRPCOk[str])
+_HEX_BATCH_DECODER = msgspec.json.Decoder(list[JSONRPCOk[str]])
+_BLOCK_DECODER = msgspec.json.Decoder(JSONRPCOk[Block])
+# block batches can carry an eth_blockNumber request too
+_BLOCK_BATCH_DECODER = msgspec.json.Decoder(list[JSONRPCOk[Block | str]])
+
+_HEAD_CALL = ('eth_blockNumber', [])
+
+_RAW_BATCH_DECODER = msgspec.json.Decoder(list[msgspec.Raw])
+_ID_DECODER = msgspec.json.Decoder(JSONRPCId)
+
+
+def _raise_rpc_error(content: bytes, batch: bool, exc: Exception):
+    # slow path, only taken when the optimistic decode failed
+    if batch:
+        for resp in _ERROR_BATCH_DECODER.decode(content):
+            if resp.error:
+                raise ValueError(resp) from exc
+
+    else:
+        resp = _ERROR_DECODER.decode(content)
+        if resp.error:
+            raise ValueError(resp) from exc
+
+    raise exc
+
+# sized for streaming, every in flight batch can hold its own stream
+_DEFAULT_LIMITS = httpx.Limits(
+    max_keepalive_connections=200,
+    max_connections=200,
+    keepalive_expiry=60
 )
+_DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+
+# most calls per json rpc batch when the chain options dont set one, most
+# providers reject or throttle bigger batches
+_DEFAULT_MAX_BATCH_SIZE = 100
+
+# blocks this far below the chain head are assumed final and can be cached
+_DEFAULT_CACHE_DEPTH = 64
+
+class _QueuedCall:
+    __slots__ = ('request', 'decoder', 'done', 'result', 'error')
+
+    def __init__(self, request: RPCRequest, decoder: msgspec.json.Decoder):
+        self.request = request
+        self.decoder = decoder
+        self.done = trio.Event()
+        self.result = None
+        self.error = None
+
+
+class _BatchQueue:
+    '''
+    Coalesces concurrent json rpc calls into batch requests. The first
+    call of a batch leads it: it waits up to `window` seconds for more
+    calls, or until `max_size` are queued, then posts the whole batch
+    and hands every response to its caller.
+    '''
+
+    def __init__(self, w3: 'AsyncWeb3', window: float, max_size: int):
+        self._w3 = w3
+        self._window = window
+        self._max_size = max_size
+        self._calls: list[_QueuedCall] | None = None
+        self._full: trio.Event | None = None
+
+    async def submit(
+        self,
+        method: str,
+        params: list,
+        decoder: msgspec.json.Decoder
+    ) -> JSONRPCOk:
+        call = _QueuedCall(
+            RPCRequest('2.0', method, params, next(self._w3._rpc_id)), decoder)
+
+        if self._calls is None:
+            calls = self._calls = [call]
+            full = self._full = trio.Event()
+            # callers in this batch only wake up once the leader flushed,
+            # so the leader cant be cancelled halfway
+            with trio.CancelScope(shield=True):
+                with trio.move_on_after(self._window):
+                    await full.wait()
+
+                if self._calls is calls:
+                    self._calls = None
+
+                await self._flush(calls)
+
+        else:
+            self._calls.append(call)
+            if len(self._calls) >= self._max_size:
+                self._calls = None
+                self._full.set()
+
+            await call.done.wait()
+
+        if call.error:
+            raise call.error
+
+        return call.result
+
+    async def _flush(self, calls: list[_QueuedCall]):
+        # calls still waiting for their response
+        by_id = {call.request.id: call for call in calls}
+        try:
+            resp = await self._w3._client.post(
+                self._w3.endpoint,
+                content=_REQ_ENCODER.encode([call.request for call in calls]),
+                headers=_JSON_HEADERS
+            )
+            for raw in _RAW_BATCH_DECODER.decode(resp.content):
+                call = by_id.pop(_ID_DECODER.decode(raw).id, None)
+                # unknown or repeated id, nothing is waiting on it
+                if call is None:
+                    continue
+
+                try:
+                    try:
+                        call.result = call.decoder.decode(raw)
+
+                    except msgspec.ValidationError as e:
+                        _raise_rpc_error(raw, False, e)
+
+                except Exception as e:
+                    call.error = e
+
+            for call in by_id.values():
+                call.error = ValueError(
+                    f'No response for request {call.request.id}')
+
+        except Exception as e:
+            # keep the responses already routed
+            for call in by_id.values():
+                call.error = e
+
+        for call in calls:
+            call.done.set()
+
+
+_CACHE_ENCODER = msgspec.msgpack.Encoder()
+_CACHE_DECODER = msgspec.msgpack.Decoder(Block)
 
 
 class AsyncWeb3:
 
-    def __init__(self, endpoint: str, options: ChainOptions):
+    def __init__(
+        self,
+        endpoint: str,
+        options: ChainOptions,
+        block_cache_path: str | Path | None = None,
+        block_cache_depth: int = _DEFAULT_CACHE_DEPTH,
+        limits: httpx.Limits = _DEFAULT_LIMITS,
+        timeout: httpx.Timeout = _DEFAULT_TIMEOUT
+    ):
         self.endpoint = endpoint
         self.options = options
 
-        self._rpc_id: Iterable = count(0)
-        self._session = asks.Session(connections=200)
+        # optional on disk cache of fetched blocks, one msgpack frame each,
+        # only blocks at least `block_cache_depth` below the head are stored
+        # so reorged ones never get served from disk
+        self._block_cache_path = None
+        if block_cache_path:
+            Path(block_cache_path).mkdir(parents=True, exist_ok=True)
+            self._block_cache_path = trio.Path(block_cache_path)
+
+        self._block_cache_depth = block_cache_depth
+        self._cache_tmp_id: Iterator[int] = count(0)
+        # highest chain head seen, a stale one only makes caching stricter
+        self._head_block: int | None = None
+
+        self._rpc_id: Iterator[int] = count(0)
+        self._chain_id: HexStr | None = None
+        # one pooled client for the lifetime of the instance, http2 lets
+        # concurrent requests share a connection, transport retries only
+        # cover failed connection attempts
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=3,
+                limits=limits
+            )
+        )
+
+        self._batch_queue = None
+        if options.get('batch_window_ms'):
+            self._batch_queue = _BatchQueue(
+                self,
+                options['batch_window_ms'] / 1000,
+                options.get('max_batch_size', _DEFAULT_MAX_BATCH_SIZE)
+            )
 
         # contracts impl
         self._web3 = DummyW3()
         self._contracts = {}
 
+    async def __aenter__(self):
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.__aexit__(*exc_info)
+
+    def _block_cache_file(self, block_num: int, full: bool) -> trio.Path:
+        return self._block_cache_path / f'{block_num}{"-full" if full else ""}'
+
+    async def _load_cached_block(self, block_num: int, full: bool) -> Block | None:
+        try:
+            frame = await self._block_cache_file(block_num, full).read_bytes()
+
+        except FileNotFoundError:
+            return None
+
+        # length prefix doesnt match on partially written frames
+        if int.from_bytes(frame[:4], 'big') != len(frame) - 4:
+            return None
+
+        return _CACHE_DECODER.decode(memoryview(frame)[4:])
+
+    def _is_final(self, block_num: int, head_block: int | None) -> bool:
+        return (
+            head_block is not None
+            and block_num <= head_block - self._block_cache_depth
+        )
+
+    async def _cache_block(self, block: Block, full: bool):
+        payload = _CACHE_ENCODER.encode(block)
+        path = self._block_cache_file(block.number, full)
+        # written aside and moved in place, a crash cant leave a partial
+        # file behind under the final name
+        tmp_path = path.with_name(f'{path.name}.{next(self._cache_tmp_id)}.tmp')
+        await tmp_path.write_bytes(len(payload).to_bytes(4, 'big') + payload)
+        await tmp_path.replace(path)
+
     async def json_rpc(
         self,
         method: str,
         params: list = [],
-        decode: bool = False
-    ) -> dict:
+        decode: bool = False,
+        decoder: msgspec.json.Decoder | None = None
+    ) -> JSONRPCOk:
+        if not decoder:
+            # decode is only asked for on hex string results
+            decoder = _HEX_DECODER if decode else _RESULT_DECODER
+
+        if self._batch_queue:
+            resp = await self._batch_queue.submit(method, params, decoder)
+
+        else:
+            resp = await self._client.post(
+                self.endpoint,
+                content=_REQ_ENCODER.encode(
+                    RPCRequest('2.0', method, params, next(self._rpc_id))),
+                headers=_JSON_HEADERS
+            )
+
+            try:
+                resp = decoder.decode(resp.content)
+
+            except msgspec.ValidationError as e:
+                _raise_rpc_error(resp.content, False, e)
 
-        resp = await self._session.post(
+        if decode:
+            # one pass, raises on non hex results
+            return unhexlify(resp.result[2:])
+
+        return resp
+
+    async def json_rpc_batch(
+        self,
+        calls: Sequence[tuple[str, list]],
+        decoder: msgspec.json.Decoder = _BATCH_DECODER
+    ) -> list[JSONRPCOk]:
+        '''
+        Send many (method, params) calls as a single json rpc batch
+        request, results are returned in the same order as `calls`.
+
+        Call lists larger than the chain options `max_batch_size` (100 by
+        default) are split into batches of that size, sent concurrently.
+        '''
+        # no awaits in between so ids are consecutive
+        requests = [
+            RPCRequest('2.0', method, params, next(self._rpc_id))
+            for method, params in calls
+        ]
+
+        limit = self.options.get('max_batch_size', _DEFAULT_MAX_BATCH_SIZE)
+        if len(requests) <= limit:
+            return await self._post_batch(requests, decoder)
+
+        results = [None] * len(requests)
+
+        async def _post_chunk(start: int):
+            results[start:start + limit] = await self._post_batch(
+                requests[start:start + limit], decoder)
+
+        async with trio.open_nursery() as n:
+            for start in range(0, len(requests), limit):
+                n.start_soon(_post_chunk, start)
+
+        return results
+
+    async def _post_batch(
+        self,
+        requests: list[RPCRequest],
+        decoder: msgspec.json.Decoder
+    ) -> list[JSONRPCOk]:
+        if not requests:
+            return []
+
+        resp = await self._client.post(
             self.endpoint,
-            json={
-                'jsonrpc': '2.0',
-                'method': method,
-                'params': params,
-                'id': next(self._rpc_id)
-            },
-            retries=3
+            content=_REQ_ENCODER.encode(requests),
+            headers=_JSON_HEADERS
         )
 
-        resp = JSONRPCResult(**resp.json())
-        if resp.error:
-            raise ValueError(resp)
+        try:
+            resps = decoder.decode(resp.content)
 
-        if decode and is_hexstr(resp.result):
-            return decode_hex(resp.result)
+        except msgspec.ValidationError as e:
+            _raise_rpc_error(resp.content, True, e)
 
-        else:
-            return resp
+        # servers are free to answer in any order
+        index = {req.id: i for i, req in enumerate(requests)}
+        results = [None] * len(requests)
+        for resp in resps:
+            i = index.pop(resp.id, None)
+            if i is None:
+                raise ValueError(f'Unexpected response id {resp.id}')
+
+            results[i] = resp
+
+        if index:
+            raise ValueError(f'No response for requests {list(index)}')
+
+        return results
+
+    async def json_rpc_raw(
+        self,
+        method: str,
+        params: list = [],
+        decoder: msgspec.json.Decoder = _HEX_DECODER
+    ) -> Any:
+        '''
+        Just the `result` of a call, by default typed as a hex string so
+        nothing past the envelope gets built.
+        '''
+        return (await self.json_rpc(method, params, decoder=decoder)).result
 
     async def chain_id(self):
-        return (await self.json_rpc('eth_chainId')).result
+        # fixed for an endpoint, only ask once
+        if self._chain_id is None:
+            self._chain_id = await self.json_rpc_raw('eth_chainId')
+
+        return self._chain_id
 
     async def block_number(self):
-        return int((await self.json_rpc('eth_blockNumber')).result, 0)
+        head_block = int(await self.json_rpc_raw('eth_blockNumber'), 16)
+        self._head_block = max(self._head_block or 0, head_block)
+        return head_block
 
     async def get_block(
         self,
         block_num: int | str = 'latest',
         full_transactions: bool = True
     ):
+        # only explicitly numbered blocks get cached, 'latest' and co move
+        # with the head
+        numbered = isinstance(block_num, int)
+        if numbered:
+            if self._block_cache_path:
+                block = await self._load_cached_block(block_num, full_transactions)
+                if block:
+                    return block
+
+            block_num = f'0x{block_num:x}'
+
         resp = await self.json_rpc(
             'eth_getBlockByNumber',
-            [block_num, full_transactions])
+            [block_num, full_transactions],
+            decoder=_BLOCK_DECODER)
 
-        if resp.result:
-            return Block.from_json(resp.result)
+        block = resp.result
+        if block and self._block_cache_path and numbered:
+            head_block = self._head_block
+            if not self._is_final(block.number, head_block):
+                head_block = await self.block_number()
 
-        else:
-            return None
+            if self._is_final(block.number, head_block):
+                await self._cache_block(block, full_transactions)
+
+        return block
 
     async def _stream_blocks(
         self,
         # can be 'latest', 'earliest', 'pending', a block number or a hash
         start_block: str | int = 'latest',
         end_block: str | int | None = None,
-        full: bool = True,
-        max_tasks: int = 10
+        # only transaction hashes unless asked for, full bodies are most of
+        # the payload
+        full: bool = False,
+        max_tasks: int = 10,
+        batch_size: int = 20,
+        # fetched but not yet yielded blocks, max_tasks * batch_size if unset
+        max_pending: int | None = None
     ):
         start_block = await self.get_block(start_block, full_transactions=full)
 
@@ -116,75 +461,131 @@ class AsyncWeb3:
             end_block = 2 ** 64
 
         head_block = await self.block_number()
-        need_head_updates = end_block > head_block
-
-        async def head_block_updater():
-            while need_head_updates:
-                await trio.sleep(2)
-                head_block = await self.block_number()
+        # if the stream can outrun the chain every batch also asks for the
+        # current head, no separate polling needed
+        track_head = end_block > head_block
+        near_head = False
 
         send_channel, receive_channel = trio.open_memory_channel(max_tasks)
-        async def block_task(block_number, event):
-            while True:
-                block = await self.get_block(block_number, full_transactions=full)
-
-                if block == None or block.timestamp == 0:
-                    continue
-
-                break
-
-            await send_channel.send(block)
-            event.set()
+        # bounds how many batches are in flight, the spawner takes a token
+        # on behalf of each batch and the batch task gives it back
+        limiter = trio.CapacityLimiter(max_tasks)
+
+        # blocks can only be fetched up to `window` ahead of the next one
+        # to yield, one credit per block given back once its yielded, so
+        # out of order blocks fit a fixed ring indexed by block number
+        window = max_pending or max_tasks * batch_size
+        # a batch has to fit the window or its credits never add up
+        batch_size = min(batch_size, window)
+        credits = trio.Semaphore(window)
+        ring = [None] * window
+
+        async def block_task(batch, send_channel):
+            # fetch a whole range in a single json rpc batch request, retry
+            # blocks not available yet, (numbers, blocks) pairs of lists go
+            # down the channel
+            nonlocal head_block
+            block_numbers = list(batch)
+            async with send_channel:
+                if self._block_cache_path:
+                    block_numbers = []
+                    cached = ([], [])
+                    for block_number in batch:
+                        block = await self._load_cached_block(block_number, full)
+                        if block:
+                            cached[0].append(block_number)
+                            cached[1].append(block)
+
+                        else:
+                            block_numbers.append(block_number)
+
+                    if cached[0]:
+                        await send_channel.send(cached)
+
+                while block_numbers:
+                    calls = [
+                        ('eth_getBlockByNumber', [f'0x{block_number:x}', full])
+                        for block_number in block_numbers
+                    ]
+                    if track_head:
+                        calls.append(_HEAD_CALL)
+
+                    results = await self.json_rpc_batch(
+                        calls, decoder=_BLOCK_BATCH_DECODER)
+
+                    if track_head:
+                        head_block = max(head_block, int(results.pop().result, 16))
+
+                    fetched = ([], [])
+                    missing = []
+                    for block_number, result in zip(block_numbers, results):
+                        block = result.result
+                        if block == None or block.timestamp == 0:
+                            missing.append(block_number)
+                            continue
+
+                        if (
+                            self._block_cache_path
+                            and self._is_final(block_number, head_block)
+                        ):
+                            await self._cache_block(block, full)
+
+                        fetched[0].append(block_number)
+                        fetched[1].append(block)
+
+                    if fetched[0]:
+                        await send_channel.send(fetched)
+
+                    block_numbers = missing
+
+            limiter.release_on_behalf_of(batch)
 
         current_block = start_block
         async with trio.open_nursery() as n:
 
-            n.start_soon(head_block_updater)
-
             async def block_task_spawner():
-                nonlocal max_tasks
-                nonlocal current_block
-                tasks = []
+                nonlocal current_block, near_head
                 async with send_channel:
                     while current_block != end_block:
 
-                        if head_block - current_block <= 3:
-                            need_head_updates = False
-                            max_tasks = 3
+                        if (
+                            track_head and not near_head
+                            and head_block - current_block <= 3
+                        ):
+                            near_head = True
+                            limiter.total_tokens = 3
 
-                        next_block_num = current_block + 1
+                        # dont batch past the end or ahead of the chain head
+                        next_block_num = max(
+                            min(current_block + batch_size, end_block, head_block),
+                            current_block + 1
+                        )
 
-                        if len(tasks) > max_tasks:
-                            await tasks[0].wait()
-                            tasks.pop(0)
+                        batch = range(current_block + 1, next_block_num + 1)
+                        for _ in batch:
+                            await credits.acquire()
 
-                        event = trio.Event()
-                        tasks.append(event)
-                        n.start_soon(block_task, next_block_num, event)
+                        await limiter.acquire_on_behalf_of(batch)
+                        n.start_soon(block_task, batch, send_channel.clone())
 
                         current_block = next_block_num
 
-                    for task in tasks:
-                        await task.wait()
-
-
             n.start_soon(block_task_spawner)
 
             looking_for = start_block + 1
-            pending = {}
             async with receive_channel:
-                async for block in receive_channel:
-                    pending[block.number] = block
-
-                    while looking_for in pending:
-                        yield pending.pop(looking_for)
+                async for block_numbers, blocks in receive_channel:
+                    for block_number, block in zip(block_numbers, blocks):
+                        ring[block_number % window] = block
+
+                    while (block := ring[looking_for % window]) is not None:
+                        ring[looking_for % window] = None
+                        yield block
+                        credits.release()
                         if looking_for == end_block:
                             break
                         looking_for += 1
 
-            # just to be sure
-            need_head_updates = False
-
     @acm
     async def stream_blocks(self, *args, **kwargs):
         async with aclosing(
@@ -210,33 +611,125 @@ class AsyncWeb3:
     ):
         return self._contracts[contract_address].decode_function_input(data)
 
-    async def eth_call(
+    def decode_fn_output(
+        self,
+        contract_address: ChecksumAddress,
+        fn_id: str,
+        data: HexStr | bytes
+    ):
+        # fn_id has to be the full signature for overloaded functions
+        contract = self._contracts[contract_address]
+        output_types = contract.find_function(fn_id)[3]
+        if isinstance(data, str):
+            data = unhexlify(data[2:])
+
+        return decode_function_output(
+            self._web3, contract.return_normalizers, output_types, data)
+
+    def decode_fn_outputs(
+        self,
+        contract_address: ChecksumAddress,
+        fn_id: str,
+        datas: Sequence[HexStr | bytes]
+    ) -> list:
+        '''
+        Decode many outputs of the same function, e.g. multicall results,
+        resolving the function and its normalizers once.
+        '''
+        contract = self._contracts[contract_address]
+        output_types = contract.find_function(fn_id)[3]
+        normalizers = contract.return_normalizers
+        return [
+            decode_function_output(
+                self._web3, normalizers, output_types,
+                unhexlify(data[2:]) if isinstance(data, str) else data)
+            for data in datas
+        ]
+
+    def _prepare_fn_call(
         self,
         contract_address: ChecksumAddress,
         fn_id: str,
         from_address: ChecksumAddress,
         nonce: int,
-        gas: int = 21000,
-        gas_price: int = 2000000,
-        value: int = 0,
-        fn_args=(),
-        fn_kwargs=()
+        gas: int,
+        gas_price: int,
+        value: int,
+        fn_args,
+        fn_kwargs
     ):
-        return await call_contract_function(
-            self._web3,
-            contract_address,
-            [],
+        return prepare_fn_call(
+            self._contracts[contract_address],
             fn_id,
             {
                 'chain_id': self.options['chain_id'],
                 'from': from_address,
-                'gas': 21000,
-                'gas_price': 2000000,
+                'gas': gas,
+                'gas_price': gas_price,
                 'nonce': nonce,
                 'type': 0,
                 'value': value
             },
-            self.json_rpc,
             fn_args, fn_kwargs,
-            contract_abi=self._contracts[contract_address].abi,
+            copy=False
         )
+
+    async def eth_call(
+        self,
+        contract_address: ChecksumAddress,
+        fn_id: str,
+        from_address: ChecksumAddress,
+        nonce: int,
+        gas: int = 21000,
+        gas_price: int = 2000000,
+        value: int = 0,
+        fn_args=(),
+        fn_kwargs=()
+    ):
+        output_types, tx = self._prepare_fn_call(
+            contract_address, fn_id, from_address, nonce,
+            gas, gas_price, value, fn_args, fn_kwargs)
+
+        return await call_contract_function(
+            self._web3,
+            self._contracts[contract_address].return_normalizers,
+            output_types,
+            tx,
+            self.json_rpc
+        )
+
+    async def eth_call_batch(
+        self,
+        calls: Sequence[tuple[ChecksumAddress, str, tuple, dict]],
+        from_address: ChecksumAddress,
+        nonce: int,
+        gas: int = 21000,
+        gas_price: int = 2000000,
+        value: int = 0
+    ) -> list:
+        '''
+        Run many (contract_address, fn_id, fn_args, fn_kwargs) calls in a
+        single `json_rpc_batch`, split in batches of the chain options
+        `max_batch_size` (100 by default). Results come back in the same
+        order as `calls`.
+        '''
+        prepared = [
+            self._prepare_fn_call(
+                contract_address, fn_id, from_address, nonce,
+                gas, gas_price, value, fn_args, fn_kwargs)
+            for contract_address, fn_id, fn_args, fn_kwargs in calls
+        ]
+
+        resps = await self.json_rpc_batch(
+            [('eth_call', [tx]) for _, tx in prepared],
+            decoder=_HEX_BATCH_DECODER
+        )
+
+        return [
+            unwrap_call_output(decode_function_output(
+                self._web3,
+                self._contracts[call[0]].return_normalizers,
+                output_types,
+                unhexlify(resp.result[2:])))
+            for call, (output_types, _), resp in zip(calls, prepared, resps)
+        ]
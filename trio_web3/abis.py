@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
 
-import json
-
+from types import MappingProxyType
 from pathlib import Path
+from functools import lru_cache
+
+import msgspec
 
 
 ABI_DIR = Path(__file__).parent.parent / 'abis'
 
-def standard_interfaces():
+# the bundled abis dont change at runtime, parse them once per process,
+# every caller shares the result so its handed out read only, copy an
+# abi before modifying it
+@lru_cache(maxsize=1)
+def standard_interfaces() -> MappingProxyType:
     abis = {}
 
     for p in ABI_DIR.glob('*.json'):
-        with open(p, 'r') as abi_file:
-            abis[p.stem] = json.loads(abi_file.read())
+        abis[p.stem] = msgspec.json.decode(p.read_bytes())
 
-    return abis
+    return MappingProxyType(abis)
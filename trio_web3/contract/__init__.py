@@ -2,6 +2,8 @@
 
 import itertools
 
+from binascii import unhexlify
+from functools import lru_cache
 from typing import (
     Any,
     Tuple,
@@ -10,38 +12,14 @@ from typing import (
     Optional,
 )
 
-from eth_typing import (
-    ChecksumAddress
+from Crypto.Hash import keccak
+from eth_utils import (
+    encode_hex,
 )
-
-
-from web3.types import (
+from eth_typing import (
     ABI,
     ABIFunction,
-    FunctionIdentifier,
-    TxParams,
-)
-from web3._utils.abi import (
-    get_abi_output_types
-)
-from web3._utils.contracts import (
-    encode_abi,
-    find_matching_event_abi,
-    find_matching_fn_abi,
-    get_function_info,
-    prepare_transaction,
-    map_abi_data,
-)
-
-from web3._utils.normalizers import (
-    BASE_RETURN_NORMALIZERS,
-)
-
-from web3.contract.contract import (
-    Contract,
-    ContractFunctions,
-    # ContractCaller,
-    ContractEvents,
+    ChecksumAddress,
 )
 
 from eth_abi.codec import (
@@ -50,22 +28,63 @@ from eth_abi.codec import (
 from eth_abi.registry import (
     registry as default_registry,
 )
-from eth_abi.exceptions import (
-    DecodingError,
+
+from trio_web3.types import TxParams
+
+from .abi import (
+    BASE_RETURN_NORMALIZERS,
+    abi_input_to_encodable,
+    abi_to_signature,
+    cached_checksum_address,
+    filter_by_type,
+    find_matching_fn_abi_and_args,
+    get_abi_input_types,
+    get_abi_output_types,
+    get_aligned_abi_inputs,
+    map_abi_data,
+    merge_args_and_kwargs,
+    named_tree,
+    validate_payable,
 )
 
 
-class DummyEth:
-    def __init__(self):
-        self.is_async = False
+# what web3's encode_abi applies to arguments for an async provider, the
+# address, bytes and string normalizers fused into one
+INPUT_NORMALIZERS = (
+    abi_input_to_encodable,
+)
+
+
+def function_selector(signature: str) -> bytes:
+    # straight to pycryptodome, skipping the eth_utils/eth_hash layers
+    return keccak.new(digest_bits=256, data=signature.encode()).digest()[:4]
+
+
+# eth_abi's registry is a module singleton already, share the codec too
+DEFAULT_CODEC = ABICodec(default_registry)
+
 
 class DummyW3:
-    def __init__(self):
-        self.codec = ABICodec(default_registry)
-        self.eth = DummyEth()
+    def __init__(self, codec: Optional[ABICodec] = None):
+        self.codec = codec or DEFAULT_CODEC
 
 
-class W3Contract(Contract):
+class ContractFunction:
+    '''
+    The function `decode_function_input` matched the calldata to.
+    '''
+
+    def __init__(self, fn_abi: ABIFunction, selector: bytes):
+        self.abi = fn_abi
+        self.fn_name = fn_abi['name']
+        self.signature = abi_to_signature(fn_abi)
+        self.selector = encode_hex(selector)
+
+    def __repr__(self) -> str:
+        return f'<Function {self.signature}>'
+
+
+class W3Contract:
 
     def __init__(
         self,
@@ -77,57 +96,228 @@ class W3Contract(Contract):
         self.abi = abi
         self.address = address
         self.bytecode = b''
+        # applied after the base ones to every decoded return value
+        self.return_normalizers: Tuple[Callable[..., Any], ...] = ()
+
+        # event abis by name, fallback & receive abis if declared
+        self.events = {
+            event_abi['name']: event_abi
+            for event_abi in filter_by_type('event', self.abi)
+        }
+        self.fallback = next(iter(filter_by_type('fallback', self.abi)), None)
+        self.receive = next(iter(filter_by_type('receive', self.abi)), None)
+
+        # (fn_abi, selector, input types, output types) per function, by
+        # signature and by name when not overloaded
+        self._fn_table = {}
+        # same entries by 4 byte selector, for decoding calldata
+        self._by_selector = {}
+        self._fn_objects = {}
+        # overloaded functions entries by name and argument count
+        self._overloads = {}
+        by_name = {}
+        for fn_abi in filter_by_type('function', self.abi):
+            signature = abi_to_signature(fn_abi)
+            entry = (
+                fn_abi,
+                function_selector(signature),
+                get_abi_input_types(fn_abi),
+                get_abi_output_types(fn_abi)
+            )
+            self._fn_table[signature] = entry
+            self._by_selector[entry[1]] = entry
+            by_name.setdefault(fn_abi['name'], []).append(entry)
+
+        for name, entries in by_name.items():
+            if len(entries) == 1:
+                self._fn_table[name] = entries[0]
+                continue
+
+            by_count = self._overloads[name] = {}
+            for entry in entries:
+                by_count.setdefault(len(entry[0]['inputs']), []).append(entry)
+
+    def find_function(
+        self,
+        fn_id: str,
+        fn_args: Any = (),
+        fn_kwargs: Any = {}
+    ) -> Tuple[ABIFunction, bytes, Tuple[str, ...], Tuple[str, ...]]:
+        return self.match_function(fn_id, fn_args, fn_kwargs)[0]
+
+    def match_function(
+        self,
+        fn_id: str,
+        fn_args: Any = (),
+        fn_kwargs: Any = {}
+    ) -> Tuple[
+        Tuple[ABIFunction, bytes, Tuple[str, ...], Tuple[str, ...]],
+        Optional[Tuple[Any, ...]]
+    ]:
+        '''
+        Like `find_function`, also returns the aligned arguments when
+        picking an overload had to align them, None otherwise.
+        '''
+        try:
+            return self._fn_table[fn_id], None
+
+        except KeyError:
+            pass
+
+        try:
+            candidates = self._overloads[fn_id][len(fn_args) + len(fn_kwargs)]
+
+        except KeyError:
+            candidates = ()
+
+        # a single overload takes that many arguments, the values dont matter
+        if len(candidates) == 1:
+            return candidates[0], None
+
+        # pick the overload matching the arguments, raises with a diagnosis
+        # if none or several do
+        fn_abi, aligned_args = find_matching_fn_abi_and_args(
+            self.abi, self.web3.codec, fn_id, fn_args, fn_kwargs)
+
+        return self._fn_table[abi_to_signature(fn_abi)], aligned_args
+
+    def get_function_by_selector(
+        self,
+        selector: bytes | int | str
+    ) -> ContractFunction:
+        if isinstance(selector, int):
+            selector = selector.to_bytes(4, 'big')
+
+        elif isinstance(selector, str):
+            selector = bytes.fromhex(selector.removeprefix('0x').rjust(8, '0'))
 
-        self.functions = ContractFunctions(self.abi, self.web3, self.address)
-        # self.caller = ContractCaller(self.abi, self.web3, self.address)
-        self.events = ContractEvents(self.abi, self.web3, self.address)
-        self.fallback = Contract.get_fallback_function(self.abi, self.web3, self.address)
-        self.receive = Contract.get_receive_function(self.abi, self.web3, self.address)
+        try:
+            return self._fn_objects[selector]
+
+        except KeyError:
+            pass
+
+        try:
+            fn_abi = self._by_selector[selector][0]
+
+        except KeyError:
+            raise ValueError(
+                f'Could not find any function with matching selector {selector.hex()}')
+
+        fn = self._fn_objects[selector] = ContractFunction(fn_abi, selector)
+        return fn
+
+    def decode_function_input(
+        self,
+        data: str | bytes
+    ) -> Tuple[ContractFunction, dict[str, Any]]:
+        if isinstance(data, str):
+            data = unhexlify(data[2:])
+
+        fn = self.get_function_by_selector(data[:4])
+        fn_abi, _, input_types, _ = self._by_selector[data[:4]]
+
+        normalized = decode_function_output(self.web3, (), input_types, data[4:])
+        return fn, named_tree(fn_abi['inputs'], normalized)
+
+
+def prepare_fn_call(
+    contract: W3Contract,
+    function_identifier: str,
+    transaction: TxParams,
+    fn_args: Any,
+    fn_kwargs: Any,
+    copy: bool = True
+) -> Tuple[Tuple[str, ...], TxParams]:
+    """
+    Build the `eth_call` transaction for a contract function, using the
+    selector and argument types precomputed on the contract.
+
+    With `copy=False` the passed `transaction` is filled in and returned
+    instead of a copy, for callers that built it just for this call.
+    """
+    fn_args = fn_args or ()
+    fn_kwargs = fn_kwargs or {}
+
+    (fn_abi, selector, input_types, output_types), aligned_arguments = \
+        contract.match_function(function_identifier, fn_args, fn_kwargs)
+
+    validate_payable(transaction, fn_abi)
+
+    if aligned_arguments is None:
+        fn_arguments = merge_args_and_kwargs(fn_abi, fn_args, fn_kwargs)
+        _, aligned_arguments = get_aligned_abi_inputs(fn_abi, fn_arguments)
+
+    normalized_arguments = map_abi_data(
+        INPUT_NORMALIZERS, input_types, aligned_arguments)
+
+    tx = dict(transaction) if copy else transaction
+    tx.setdefault('to', contract.address)
+    tx['data'] = encode_hex(
+        selector + contract.web3.codec.encode(input_types, normalized_arguments))
+
+    return output_types, tx
+
+
+@lru_cache(maxsize=None)
+def _checksum_positions(output_types: Tuple[str, ...]) -> Optional[Tuple[int, ...]]:
+    # the only base return normalizer checksums addresses, when those are
+    # all top level the decoded values can be fixed up in place, nested
+    # ones need the full map_abi_data walk
+    if any('address' in t and t != 'address' for t in output_types):
+        return None
+
+    return tuple(i for i, t in enumerate(output_types) if t == 'address')
+
+
+def decode_function_output(
+    web3: DummyW3,
+    normalizers: Tuple[Callable[..., Any], ...],
+    output_types: Tuple[str, ...],
+    data: bytes,
+) -> Any:
+    output_data = web3.codec.decode(output_types, data)
+
+    if not normalizers:
+        positions = _checksum_positions(output_types)
+        if positions is not None:
+            output_data = list(output_data)
+            for i in positions:
+                output_data[i] = cached_checksum_address(output_data[i])
+
+            return output_data
+
+    return map_abi_data(
+        _return_normalizers(tuple(normalizers)), output_types, output_data)
+
+
+@lru_cache(maxsize=None)
+def _return_normalizers(
+    normalizers: Tuple[Callable[..., Any], ...]
+) -> Tuple[Callable[..., Any], ...]:
+    return tuple(itertools.chain(BASE_RETURN_NORMALIZERS, normalizers))
 
 
 async def call_contract_function(
     web3: DummyW3,
-    address: ChecksumAddress,
     normalizers: Tuple[Callable[..., Any], ...],
-    function_identifier: FunctionIdentifier,
+    output_types: Tuple[str, ...],
     transaction: TxParams,
     rpc_fn: Coroutine,
-    fn_args: Any,
-    fn_kwargs: Any,
-    contract_abi: Optional[ABI] = None,
-    fn_abi: Optional[ABIFunction] = None,
 ) -> Any:
     """
     Helper function for interacting with a contract function using the
     `eth_call` API.
     """
-    tx = prepare_transaction(
-        address,
-        web3,
-        fn_identifier=function_identifier,
-        contract_abi=contract_abi,
-        fn_abi=fn_abi,
-        transaction=transaction,
-        fn_args=fn_args,
-        fn_kwargs=fn_kwargs,
-    )
-
     return_data = await rpc_fn(
-        'eth_call', [tx], decode=True
+        'eth_call', [transaction], decode=True
     )
 
-    if fn_abi is None:
-        fn_abi = find_matching_fn_abi(contract_abi, web3.codec, function_identifier, fn_args, fn_kwargs)
+    return unwrap_call_output(decode_function_output(
+        web3, normalizers, output_types, return_data))
 
-    output_types = get_abi_output_types(fn_abi)
-    output_data = web3.codec.decode(output_types, return_data)
-
-    _normalizers = itertools.chain(
-        BASE_RETURN_NORMALIZERS,
-        normalizers,
-    )
-    normalized_data = map_abi_data(_normalizers, output_types, output_data)
 
+def unwrap_call_output(normalized_data: Any) -> Any:
     if len(normalized_data) == 1:
         return normalized_data[0]
     else:
@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+
+'''
+The subset of web3.py's ABI helpers the contract layer needs, ported so
+the package only depends on eth_abi and eth_utils.
+'''
+
+import re
+import copy
+import functools
+import itertools
+
+from collections import abc
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from eth_abi.codec import ABICodec
+from eth_abi.grammar import (
+    BasicType,
+    TupleType,
+    parse,
+)
+from eth_abi.exceptions import ParseError
+from eth_typing import (
+    ABI,
+    ABIFunction,
+    ChecksumAddress,
+    TypeStr,
+)
+from eth_utils import (
+    hexstr_if_str,
+    is_binary_address,
+    is_bytes,
+    is_checksum_address,
+    is_hex_address,
+    is_list_like,
+    text_if_str,
+    to_bytes,
+    to_checksum_address,
+    to_text,
+)
+from eth_utils.abi import collapse_if_tuple
+
+from trio_web3.types import TxParams
+
+
+# abi filtering
+
+def filter_by_type(_type: str, contract_abi: ABI) -> List[ABIFunction]:
+    return [abi for abi in contract_abi if abi['type'] == _type]
+
+
+def filter_by_name(name: str, contract_abi: ABI) -> List[ABIFunction]:
+    return [
+        abi
+        for abi in contract_abi
+        if (
+            abi['type'] not in ('fallback', 'constructor', 'receive')
+            and abi['name'] == name
+        )
+    ]
+
+
+def filter_by_argument_count(
+    num_arguments: int, contract_abi: ABI
+) -> List[ABIFunction]:
+    return [abi for abi in contract_abi if len(abi['inputs']) == num_arguments]
+
+
+def _aligned_if_encodable(
+    function_abi: ABIFunction,
+    abi_codec: ABICodec,
+    args: Sequence[Any],
+    kwargs: Dict[str, Any],
+) -> Optional[Tuple[Any, ...]]:
+    # the aligned arguments if they encode to `function_abi`, None otherwise
+    try:
+        arguments = merge_args_and_kwargs(function_abi, args, kwargs)
+    except TypeError:
+        return None
+
+    if len(function_abi.get('inputs', [])) != len(arguments):
+        return None
+
+    try:
+        types, aligned_args = get_aligned_abi_inputs(function_abi, arguments)
+    except TypeError:
+        return None
+
+    if all(
+        abi_codec.is_encodable(_type, arg) for _type, arg in zip(types, aligned_args)
+    ):
+        return aligned_args
+
+    return None
+
+
+# (id(abi), name, arg count) -> (abi, candidates), keeping the abi alive so
+# its id cant be reused, abis are never mutated once loaded
+_candidates_cache = {}
+
+
+def _fn_candidates(abi: ABI, name: str, num_arguments: int) -> List[ABIFunction]:
+    key = (id(abi), name, num_arguments)
+    try:
+        cached_abi, candidates = _candidates_cache[key]
+        if cached_abi is abi:
+            return candidates
+
+    except KeyError:
+        pass
+
+    if len(_candidates_cache) >= 4096:
+        _candidates_cache.clear()
+
+    candidates = filter_by_argument_count(num_arguments, filter_by_name(name, abi))
+    _candidates_cache[key] = (abi, candidates)
+    return candidates
+
+
+def find_matching_fn_abi_and_args(
+    abi: ABI,
+    abi_codec: ABICodec,
+    fn_identifier: str,
+    args: Optional[Sequence[Any]] = None,
+    kwargs: Optional[Any] = None,
+) -> Tuple[ABIFunction, Tuple[Any, ...]]:
+    '''
+    Find the function named ``fn_identifier`` the arguments encode to,
+    returned with the arguments as aligned by the encodability check so
+    callers dont merge and align them again. Raises ValueError when no
+    function or more than one matches.
+    '''
+    args = args or tuple()
+    kwargs = kwargs or dict()
+    num_arguments = len(args) + len(kwargs)
+
+    if not isinstance(fn_identifier, str):
+        raise TypeError('Unsupported function identifier')
+
+    # only encodability depends on the argument values
+    matches = []
+    for candidate in _fn_candidates(abi, fn_identifier, num_arguments):
+        aligned_args = _aligned_if_encodable(candidate, abi_codec, args, kwargs)
+        if aligned_args is not None:
+            matches.append((candidate, aligned_args))
+
+    if len(matches) == 1:
+        return matches[0]
+
+    # none or several matched, work out which for the error, functions
+    # with another argument count never encode so `matches` is complete
+    matching_identifiers = filter_by_name(fn_identifier, abi)
+    matching_function_signatures = [
+        abi_to_signature(func) for func in matching_identifiers
+    ]
+
+    arg_count_matches = len(_fn_candidates(abi, fn_identifier, num_arguments))
+    encoding_matches = len(matches)
+
+    diagnosis = ''
+    if arg_count_matches == 0:
+        diagnosis = '\nFunction invocation failed due to improper number of arguments.'
+    elif encoding_matches == 0:
+        diagnosis = '\nFunction invocation failed due to no matching argument types.'
+    elif encoding_matches > 1:
+        diagnosis = (
+            '\nAmbiguous argument encoding. '
+            'Provided arguments can be encoded to multiple functions '
+            'matching this call.'
+        )
+
+    raise ValueError(
+        f'\nCould not identify the intended function with name `{fn_identifier}`, '
+        f'positional arguments with type(s) `{[type(a).__name__ for a in args]}` and '
+        f'keyword arguments `{sorted(kwargs)}`.'
+        f'\nFound {len(matching_identifiers)} function(s) with '
+        f'the name `{fn_identifier}`: {matching_function_signatures}{diagnosis}'
+    )
+
+
+# signatures and types
+
+_NAME_REGEX = '[a-zA-Z_][a-zA-Z0-9_]*'
+_ENUM_REGEX = f'^{_NAME_REGEX}\\.{_NAME_REGEX}$'
+
+
+@functools.lru_cache(maxsize=None)
+def is_probably_enum(abi_type: TypeStr) -> bool:
+    return bool(re.match(_ENUM_REGEX, abi_type))
+
+
+def normalize_event_input_types(abi_args: Iterable[Dict[str, Any]]):
+    # library enums show up as `Lib.Enum`, they are encoded as uint8
+    for arg in abi_args:
+        if is_probably_enum(arg['type']):
+            yield {k: 'uint8' if k == 'type' else v for k, v in arg.items()}
+        else:
+            yield arg
+
+
+def _cached_per_element(fn: Callable[[Dict[str, Any]], Any]):
+    # abi elements are never mutated once loaded, results are cached by
+    # id with the element kept alive so its id cant be reused
+    cache = {}
+
+    @functools.wraps(fn)
+    def wrapper(abi: Dict[str, Any]) -> Any:
+        try:
+            cached_abi, result = cache[id(abi)]
+            if cached_abi is abi:
+                return result
+
+        except KeyError:
+            pass
+
+        if len(cache) >= 4096:
+            cache.clear()
+
+        result = fn(abi)
+        cache[id(abi)] = (abi, result)
+        return result
+
+    return wrapper
+
+
+@_cached_per_element
+def abi_to_signature(abi: ABIFunction) -> str:
+    fn_input_types = ','.join(
+        collapse_if_tuple(arg)
+        for arg in normalize_event_input_types(abi.get('inputs', []))
+    )
+    return f'{abi["name"]}({fn_input_types})'
+
+
+@_cached_per_element
+def get_abi_input_types(abi: ABIFunction) -> Tuple[str, ...]:
+    if 'inputs' not in abi and (abi['type'] == 'fallback' or abi['type'] == 'receive'):
+        return ()
+    else:
+        return tuple(collapse_if_tuple(arg) for arg in abi['inputs'])
+
+
+@_cached_per_element
+def get_abi_output_types(abi: ABIFunction) -> Tuple[str, ...]:
+    if abi['type'] == 'fallback':
+        return ()
+    else:
+        return tuple(collapse_if_tuple(arg) for arg in abi['outputs'])
+
+
+# argument alignment
+
+def merge_args_and_kwargs(
+    function_abi: ABIFunction, args: Sequence[Any], kwargs: Dict[str, Any]
+) -> Tuple[Any, ...]:
+    '''
+    Takes a list of positional args (``args``) and a dict of keyword args
+    (``kwargs``) defining values to be passed to a call to the contract function
+    described by ``function_abi``.  Checks to ensure that the correct number of
+    args were given, no duplicate args were given, and no unknown args were
+    given.  Returns a list of argument values aligned to the order of inputs
+    defined in ``function_abi``.
+    '''
+    # Ensure the function is being applied to the correct number of args
+    if len(args) + len(kwargs) != len(function_abi.get('inputs', [])):
+        raise TypeError(
+            f'Incorrect argument count. Expected \'{len(function_abi["inputs"])}\''
+            f'. Got \'{len(args) + len(kwargs)}\''
+        )
+
+    # If no keyword args were given, we don't need to align them
+    if not kwargs:
+        return args
+
+    # Sort kwargs into duplicates of positional args and unknown names
+    name_to_pos = _input_positions(function_abi)
+    num_args = len(args)
+    duplicate_args = []
+    unknown_args = []
+    for name in kwargs:
+        pos = name_to_pos.get(name)
+        if pos is None:
+            unknown_args.append(name)
+        elif pos < num_args:
+            duplicate_args.append(name)
+
+    if duplicate_args:
+        raise TypeError(
+            f'{function_abi.get("name")}() got multiple values for argument(s) '
+            f'\'{", ".join(duplicate_args)}\''
+        )
+
+    if unknown_args:
+        if function_abi.get('name'):
+            raise TypeError(
+                f'{function_abi.get("name")}() got unexpected keyword argument(s)'
+                f' \'{", ".join(unknown_args)}\''
+            )
+        raise TypeError(
+            f'Type: \'{function_abi.get("type")}\' got unexpected keyword argument(s)'
+            f' \'{", ".join(unknown_args)}\''
+        )
+
+    # Fill kwargs in at their position in the ABI, after the positional ones
+    merged = list(args)
+    merged.extend([None] * len(kwargs))
+    for name, value in kwargs.items():
+        merged[name_to_pos[name]] = value
+
+    return tuple(merged)
+
+
+@_cached_per_element
+def _input_positions(function_abi: ABIFunction) -> Dict[str, int]:
+    positions = {}
+    for i, arg_abi in enumerate(function_abi['inputs']):
+        positions.setdefault(arg_abi['name'], i)
+
+    return positions
+
+
+TUPLE_TYPE_STR_RE = re.compile(r'^(tuple)((\[([1-9]\d*\b)?])*)??$')
+
+
+@functools.lru_cache(maxsize=None)
+def get_tuple_type_str_parts(s: str) -> Optional[Tuple[str, Optional[str]]]:
+    '''
+    Takes a JSON ABI type string.  For tuple type strings, returns the separated
+    prefix and array dimension parts.  For all other strings, returns ``None``.
+    '''
+    match = TUPLE_TYPE_STR_RE.match(s)
+
+    if match is not None:
+        tuple_prefix = match.group(1)
+        tuple_dims = match.group(2)
+
+        return tuple_prefix, tuple_dims
+
+    return None
+
+
+def _align_abi_input(arg_abi: Dict[str, Any], arg: Any) -> Tuple[Any, ...]:
+    '''
+    Aligns the values of any mapping at any level of nesting in ``arg``
+    according to the layout of the corresponding abi spec, tuples and
+    arrays of them come out as plain tuples.
+    '''
+    abi_type = arg_abi['type']
+    if not abi_type.startswith('tuple'):
+        # scalars and arrays of them, most arguments
+        return arg
+
+    tuple_parts = get_tuple_type_str_parts(abi_type)
+
+    if tuple_parts is None:
+        # Arg is non-tuple.  Just return value.
+        return arg
+
+    tuple_prefix, tuple_dims = tuple_parts
+    if tuple_dims is None:
+        # Arg is non-list tuple.  Each sub arg in `arg` will be aligned
+        # according to its corresponding abi.
+        sub_abis = arg_abi['components']
+    else:
+        num_dims = tuple_dims.count('[')
+
+        # Arg is list tuple.  A non-list version of its abi will be used to
+        # align each element in `arg`.
+        new_abi = copy.copy(arg_abi)
+        new_abi['type'] = tuple_prefix + '[]' * (num_dims - 1)
+
+        sub_abis = itertools.repeat(new_abi)
+
+    if isinstance(arg, abc.Mapping):
+        # Arg is mapping.  Align values according to abi order.
+        aligned_arg = tuple([arg[abi['name']] for abi in sub_abis])
+    else:
+        aligned_arg = arg
+
+    if not is_list_like(aligned_arg):
+        raise TypeError(
+            f'Expected non-string sequence for "{arg_abi.get("type")}" '
+            f'component type: got {aligned_arg}'
+        )
+
+    # always a plain tuple, the codec takes any sequence
+    return tuple([
+        _align_abi_input(sub_abi, sub_arg)
+        for sub_abi, sub_arg in zip(sub_abis, aligned_arg)
+    ])
+
+
+def get_aligned_abi_inputs(
+    abi: ABIFunction, args: Tuple[Any, ...] | abc.Mapping
+) -> Tuple[Tuple[Any, ...], Tuple[Any, ...]]:
+    '''
+    Takes a function ABI (``abi``) and a sequence or mapping of args (``args``).
+    Returns a tuple of type strings for the function's inputs and a tuple of
+    arguments which have been aligned to the layout of those types.  The args
+    contained in ``args`` may contain nested mappings or sequences corresponding
+    to tuple-encoded values in ``abi``.
+    '''
+    input_abis = abi.get('inputs', [])
+    types, has_tuples = _input_layout(abi)
+
+    if isinstance(args, abc.Mapping):
+        # `args` is mapping.  Align values according to abi order.
+        args = tuple([args[abi['name']] for abi in input_abis])
+
+    if not has_tuples:
+        # nothing nested to align
+        return types, tuple(args)
+
+    return (
+        types,
+        tuple([_align_abi_input(abi, arg) for abi, arg in zip(input_abis, args)]),
+    )
+
+
+@_cached_per_element
+def _input_layout(abi: ABIFunction) -> Tuple[Tuple[str, ...], bool]:
+    # collapsed input types and whether any of them needs aligning
+    input_abis = abi.get('inputs', [])
+    return (
+        tuple([collapse_if_tuple(abi) for abi in input_abis]),
+        any(abi['type'].startswith('tuple') for abi in input_abis)
+    )
+
+
+def named_tree(
+    abi: Iterable[Dict[str, Any]],
+    data: Iterable[Tuple[Any, ...]],
+) -> Dict[str, Any]:
+    '''
+    Convert function inputs/outputs or event data tuple to dict with names from ABI.
+    '''
+    names = [item['name'] for item in abi]
+    items = [_named_subtree(*item) for item in zip(abi, data)]
+
+    return dict(zip(names, items))
+
+
+def _named_subtree(abi: Dict[str, Any], data: Tuple[Any, ...]) -> Any:
+    abi_type = parse(collapse_if_tuple(abi))
+
+    if abi_type.is_array:
+        item_type = abi_type.item_type.to_type_str()
+        item_abi = {**abi, 'type': item_type, 'name': ''}
+        items = [_named_subtree(item_abi, item) for item in data]
+        return items
+
+    elif isinstance(abi_type, TupleType):
+        names = [item['name'] for item in abi['components']]
+        items = [_named_subtree(*item) for item in zip(abi['components'], data)]
+
+        if len(names) == len(data):
+            return dict(zip(names, items))
+        else:
+            raise ValueError(
+                f'ABI fields {names} has length {len(names)} but received '
+                f'data {data} with length {len(data)}'
+            )
+
+    return data
+
+
+def validate_payable(transaction: TxParams, abi: ABIFunction) -> None:
+    '''
+    Raise ValueError if non-zero ether is sent to a non-payable function.
+    '''
+    value = transaction.get('value', 0)
+    if isinstance(value, (str, bytes, bytearray)):
+        value = int(value, 16)
+
+    if value != 0:
+        if (
+            'payable' in abi
+            and not abi['payable']
+            or 'stateMutability' in abi
+            and abi['stateMutability'] == 'nonpayable'
+        ):
+            raise ValueError(
+                'Sending non-zero ether to a contract function '
+                'with payable=False. Please ensure that '
+                'transaction\'s value is 0.'
+            )
+
+
+# data normalization
+
+@functools.lru_cache(maxsize=None)
+def _type_layout(
+    type_str: TypeStr
+) -> Tuple[TypeStr, Optional[TypeStr], Optional[Tuple[TypeStr, ...]]]:
+    # normalized type string, item type for arrays, component types for
+    # tuples, type strings come from a small set so render them once
+    abi_type = parse(type_str)
+
+    if abi_type.is_array:
+        return abi_type.to_type_str(), abi_type.item_type.to_type_str(), None
+
+    elif isinstance(abi_type, TupleType):
+        return abi_type.to_type_str(), None, tuple(
+            comp_type.to_type_str() for comp_type in abi_type.components)
+
+    return abi_type.to_type_str(), None, None
+
+
+def _normalize_abi_value(
+    normalizers: Sequence[Callable[[TypeStr, Any], Tuple[TypeStr, Any]]],
+    type_str: TypeStr,
+    value: Any,
+) -> Any:
+    type_str, item_type_str, comp_type_strs = _type_layout(type_str)
+
+    if item_type_str is not None:
+        value = [
+            _normalize_abi_value(normalizers, item_type_str, item)
+            for item in value
+        ]
+    elif comp_type_strs is not None:
+        value = type(value)(
+            _normalize_abi_value(normalizers, comp_type_str, comp_value)
+            for comp_type_str, comp_value in zip(comp_type_strs, value)
+        )
+
+    for normalizer in normalizers:
+        type_str, value = normalizer(type_str, value)
+
+    return value
+
+
+def map_abi_data(
+    normalizers: Sequence[Callable[[TypeStr, Any], Tuple[TypeStr, Any]]],
+    types: Sequence[TypeStr],
+    data: Sequence[Any],
+) -> List[Any]:
+    '''
+    Apply normalizers to data in the context of the relevant types, each
+    normalizer takes and returns a (datatype, data) pair.
+
+    Done in a single bottom up walk, every value goes through all the
+    normalizers in order once its items, if any, are normalized.
+    '''
+    return [
+        _normalize_abi_value(normalizers, type_str, value)
+        for type_str, value in zip(types, data)
+    ]
+
+
+# normalizers
+
+@functools.lru_cache(maxsize=4096)
+def cached_checksum_address(value: str) -> ChecksumAddress:
+    # decoded addresses repeat a lot, skip the keccak for the known ones
+    return to_checksum_address(value)
+
+
+def validate_address(value: Any) -> None:
+    # no ens, names cant be resolved without a provider
+    if isinstance(value, str):
+        _validate_hex_address(value)
+        return
+
+    if is_bytes(value):
+        if not is_binary_address(value):
+            raise ValueError(
+                'Address must be 20 bytes when input type is bytes', value)
+        return
+
+    raise TypeError(f'Address {value} must be provided as a string')
+
+
+@functools.lru_cache(maxsize=4096)
+def _validate_hex_address(value: str) -> None:
+    # calls tend to reuse a few addresses, only valid ones get cached as
+    # raising skips the cache
+    if not is_hex_address(value):
+        raise ValueError(
+            'Address must be 20 bytes, as a hex string with a 0x prefix', value)
+
+    if not is_checksum_address(value):
+        if value == value.lower():
+            raise ValueError(
+                'Only checksum addresses are accepted, use '
+                'to_checksum_address(lower_case_address)', value)
+        else:
+            raise ValueError('Address has an invalid EIP-55 checksum', value)
+
+
+def addresses_checksummed(
+    type_str: TypeStr, data: Any
+) -> Tuple[TypeStr, Any]:
+    if type_str == 'address':
+        return type_str, cached_checksum_address(data)
+    return type_str, data
+
+
+@functools.lru_cache(maxsize=None)
+def _is_scalar_bytes(type_str: TypeStr) -> bool:
+    try:
+        abi_type = parse(type_str)
+    except ParseError:
+        return False
+
+    return (
+        isinstance(abi_type, BasicType)
+        and abi_type.base == 'bytes'
+        and not abi_type.is_array
+    )
+
+
+def abi_input_to_encodable(type_str: TypeStr, data: Any) -> Tuple[TypeStr, Any]:
+    '''
+    Make an argument value encodable: addresses are validated and binary
+    ones checksummed, bytes given for a `string` are decoded to text and
+    hex strings given for scalar `bytes` types are decoded to bytes.
+    '''
+    if type_str == 'address':
+        validate_address(data)
+        if is_binary_address(data):
+            return type_str, to_checksum_address(data)
+
+    elif type_str == 'string':
+        return type_str, text_if_str(to_text, data)
+
+    elif _is_scalar_bytes(type_str):
+        return type_str, hexstr_if_str(to_bytes, data)
+
+    return type_str, data
+
+
+BASE_RETURN_NORMALIZERS = (
+    addresses_checksummed,
+)
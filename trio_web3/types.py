@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 
-import json
-
-from typing import NewType, TypedDict
+from typing import Generic, NewType, TypedDict, TypeVar
 
 import msgspec
 
 from datetime import datetime
+from functools import cached_property
 
-from msgspec import Struct
-from eth_utils import to_int, is_hex
+from msgspec import Struct, field
 from eth_typing import (
     Address,
     ChecksumAddress,
@@ -37,115 +35,183 @@ TxParams = TypedDict(
 )
 
 
-class ChainOptions(TypedDict):
+T = TypeVar('T')
+
+
+class _ChainOptionsBase(TypedDict, total=False):
+    # coalesce concurrent json_rpc calls into batches, disabled if unset
+    batch_window_ms: float
+    # most calls sent in one batch request, 100 if unset
+    max_batch_size: int
+
+
+class ChainOptions(_ChainOptionsBase):
     chain_id: int
 
 
-class JSONRPCResult(Struct):
+class RPCRequest(Struct, gc=False):
+    jsonrpc: str
+    method: str
+    params: list
+    id: int
+
+
+class JSONRPCResult(Struct, Generic[T], frozen=True, gc=False):
     id: int
     jsonrpc: str = '2.0'
-    result: dict | None = None
+    result: T | None = None
     error: dict | None = None
 
 
-class Transaction(Struct):
+class JSONRPCOk(Struct, Generic[T], frozen=True, gc=False):
+    '''
+    Successful response, decoding fails on error responses as they lack
+    `result`, those are decoded again as a `JSONRPCResult`.
+    '''
+    id: int
+    result: T | None
+
+
+class JSONRPCId(Struct, frozen=True, gc=False):
+    '''
+    Just the id of a response, enough to route batch members before
+    decoding them with their own decoder.
+    '''
+    id: int
+
+
+# public field order of `to_dict`, snake_case keys with int quantities
+_TX_DICT_FIELDS = (
+    'block_hash', 'block_number', 'sender', 'gas', 'gas_price', 'hash',
+    'input', 'nonce', 'to', 'transaction_index', 'value', 'v', 'r', 's'
+)
+
+_BLOCK_DICT_FIELDS = (
+    'mix_hash', 'size', 'total_difficulty', 'uncles', 'difficulty',
+    'extra_data', 'gas_limit', 'miner', 'nonce', 'parent_hash',
+    'receipts_root', 'sha_3_uncles', 'state_root', 'transactions_root',
+    'gas_used', 'hash', 'logs_bloom', 'number', 'timestamp'
+)
+
+
+class Transaction(Struct, rename='camel', dict=True, frozen=True):
     block_hash: HexStr
-    block_number: int
-    sender: ChecksumAddress
-    gas: int
-    gas_price: int
+    _block_number: HexStr = field(name='blockNumber')
+    sender: ChecksumAddress = field(name='from')
+    _gas: HexStr = field(name='gas')
+    _gas_price: HexStr = field(name='gasPrice')
     hash: HexStr
     input: HexStr
-    nonce: int
-    to: ChecksumAddress
-    transaction_index: int
+    _nonce: HexStr = field(name='nonce')
+    to: ChecksumAddress | None
+    _transaction_index: HexStr = field(name='transactionIndex')
     value: HexStr
-    v: int
+    _v: HexStr = field(name='v')
     r: HexStr
     s: HexStr
 
+    @cached_property
+    def block_number(self) -> int:
+        return int(self._block_number, 16)
+
+    @cached_property
+    def gas(self) -> int:
+        return int(self._gas, 16)
+
+    @cached_property
+    def gas_price(self) -> int:
+        return int(self._gas_price, 16)
+
+    @cached_property
+    def nonce(self) -> int:
+        return int(self._nonce, 16)
+
+    @cached_property
+    def transaction_index(self) -> int:
+        return int(self._transaction_index, 16)
+
+    @cached_property
+    def v(self) -> int:
+        return int(self._v, 16)
+
     @staticmethod
     def from_json(obj):
-        return Transaction(
-            block_hash=obj['blockHash'],
-            block_number=to_int(hexstr=obj['blockNumber']),
-            sender=obj['from'],
-            gas=to_int(hexstr=obj['gas']),
-            gas_price=to_int(hexstr=obj['gasPrice']),
-            hash=obj['hash'],
-            input=obj['input'],
-            nonce=to_int(hexstr=obj['nonce']),
-            to=obj['to'],
-            transaction_index=to_int(hexstr=obj['transactionIndex']),
-            value=obj['value'],
-            v=to_int(hexstr=obj['v']),
-            r=obj['r'],
-            s=obj['s']
-        )
+        return msgspec.convert(obj, type=Transaction)
 
     def to_dict(self):
-        return json.loads(msgspec.json.encode(self))
+        return {name: getattr(self, name) for name in _TX_DICT_FIELDS}
 
 
-class Block(Struct):
+class Block(Struct, rename='camel', dict=True, frozen=True):
     mix_hash: str
-    size: int
-    total_difficulty: int
+    _size: str = field(name='size')
+    _total_difficulty: str = field(name='totalDifficulty')
     uncles: list
-    difficulty: int
+    _difficulty: str = field(name='difficulty')
     extra_data: str
-    gas_limit: int
+    _gas_limit: str = field(name='gasLimit')
     miner: str
-    nonce: int
+    _nonce: str = field(name='nonce')
     parent_hash: str
     receipts_root: str
     sha_3_uncles: str
     state_root: str
     transactions_root: str
-    gas_used: int
+    _gas_used: str = field(name='gasUsed')
     hash: str
     logs_bloom: str
-    number: int
-    timestamp: float
-    transactions: list[Transaction]
+    _number: str = field(name='number')
+    _timestamp: str | int | float = field(name='timestamp')
+    # full transaction objects or just their hashes
+    transactions: list[Transaction | str]
+
+    @cached_property
+    def size(self) -> int:
+        return int(self._size, 16)
+
+    @cached_property
+    def total_difficulty(self) -> int:
+        return int(self._total_difficulty, 16)
+
+    @cached_property
+    def difficulty(self) -> int:
+        return int(self._difficulty, 16)
+
+    @cached_property
+    def gas_limit(self) -> int:
+        return int(self._gas_limit, 16)
+
+    @cached_property
+    def nonce(self) -> int:
+        return int(self._nonce, 16)
+
+    @cached_property
+    def gas_used(self) -> int:
+        return int(self._gas_used, 16)
+
+    @cached_property
+    def number(self) -> int:
+        return int(self._number, 16)
+
+    @cached_property
+    def timestamp(self) -> int | float:
+        timestamp = self._timestamp
+        if isinstance(timestamp, str):
+            if timestamp.startswith(('0x', '0X')):
+                return int(timestamp, 16)
+
+            return datetime.fromisoformat(timestamp).timestamp()
+
+        return timestamp
 
     @staticmethod
     def from_json(obj):
-
-        timestamp = obj['timestamp']
-        if isinstance(timestamp, str):
-            if is_hex(timestamp):
-                timestamp = to_int(hexstr=timestamp)
-
-            else:
-                timestamp = datetime.fromisoformat(timestamp)
-
-        elif not isinstance(timestamp, int) and not isinstance(timestamp, float):
-            raise ValueError(f'Unsupported timestamp type: {timestamp}')
-
-
-        return Block(
-            mix_hash=obj['mixHash'],
-            size=to_int(hexstr=obj['size']),
-            total_difficulty=to_int(hexstr=obj['totalDifficulty']),
-            uncles=obj['uncles'],
-            difficulty=to_int(hexstr=obj['difficulty']),
-            extra_data=obj['extraData'],
-            gas_limit=to_int(hexstr=obj['gasLimit']),
-            miner=obj['miner'],
-            nonce=to_int(hexstr=obj['nonce']),
-            parent_hash=obj['parentHash'],
-            receipts_root=obj['receiptsRoot'],
-            sha_3_uncles=obj['sha3Uncles'],
-            state_root=obj['stateRoot'],
-            transactions_root=obj['transactionsRoot'],
-            gas_used=to_int(hexstr=obj['gasUsed']),
-            hash=obj['hash'],
-            logs_bloom=obj['logsBloom'],
-            number=to_int(hexstr=obj['number']),
-            timestamp=to_int(hexstr=obj['timestamp']),
-            transactions=[Transaction.from_json(tx) for tx in obj['transactions']]
-        )
+        return msgspec.convert(obj, type=Block)
 
     def to_dict(self):
-        return json.loads(msgspec.json.encode(self))
+        block = {name: getattr(self, name) for name in _BLOCK_DICT_FIELDS}
+        block['transactions'] = [
+            tx.to_dict() if isinstance(tx, Transaction) else tx
+            for tx in self.transactions
+        ]
+        return block